@@ -1,24 +1,34 @@
 import os
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 
 # Setting up file paths for the persistent Chroma vector store directory.
 current_dir = os.path.dirname(os.path.abspath(__file__))
 persistent_directory = os.path.join(current_dir, "db", "chroma_db")
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+# Caches embeddings on disk so repeated queries are not sent to OpenAI again.
+underlying_embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+embeddings = CacheBackedEmbeddings.from_bytes_store(
+    underlying_embeddings,
+    LocalFileStore(os.path.join(current_dir, ".emb_cache")),
+    namespace=underlying_embeddings.model,
+    query_embedding_cache=True
+)
 
 # Loads the Chroma vector store from the persistent directory.
 db = Chroma(persist_directory=persistent_directory, embedding_function=embeddings)
 
 query = "Where does Gandalf meet Frodo?"
 
-# Configures a retriever with similarity-based search parameters (e.g., top 10 results, minimum score threshold).
+# Configures a retriever with max marginal relevance search (top 5 diverse results out of 20 candidates).
 retriever = db.as_retriever(
-    search_type="similarity_score_threshold",
+    search_type="mmr",
     search_kwargs={
-        "k": 10,
-        "score_threshold": 0.1
+        "k": 5,
+        "fetch_k": 20,
+        "lambda_mult": 0.5
     },
 )
 relevent_docs = retriever.invoke(query)
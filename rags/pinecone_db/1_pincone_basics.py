@@ -1,12 +1,17 @@
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
-from pinecone import Pinecone, ServerlessSpec
-from pinecone.core.openapi.shared.exceptions import PineconeApiException
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
 from langchain.text_splitter import CharacterTextSplitter
-from langchain.schema.runnable import RunnableLambda
 from PyPDF2 import PdfReader
 from dotenv import load_dotenv
+import numpy as np
+import asyncio
+import shutil
+import faiss
+import json
+import sys
 import os
 load_dotenv()
 
@@ -57,21 +62,16 @@ for chunk in raw_chunks:
 # Create a Pinecone index
 pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 index_name = "rag-pinecone"
-
-if index_name not in pc.list_indexes():
-    try:
-        pc.create_index(
-            name=index_name,
-            dimension=1536,
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-        print(f"Index '{index_name}' created.")
-    except PineconeApiException as e:
-        if e.status == 409:  # Conflict error, index already exists
-            print(f"Index '{index_name}' already exists.")
-        else: 
-            raise e  
+namespace = "pdfs_v1"
+
+if not pc.has_index(index_name):
+    pc.create_index(
+        name=index_name,
+        dimension=1536,
+        metric="cosine",
+        spec=ServerlessSpec(cloud="aws", region="us-east-1")
+    )
+    print(f"Index '{index_name}' created.")
 else:
     print(f"Index '{index_name}' already exists.")
 
@@ -83,30 +83,52 @@ embeddings = OpenAIEmbeddings(
 )
 
 
+# Semantic cache of answered questions, keyed by the normalized query embedding
+cache_dir = os.path.join(current_dir, "semantic_cache")
+cache_index_path = os.path.join(cache_dir, "queries.faiss")
+cache_answers_path = os.path.join(cache_dir, "answers.json")
+cache_score_threshold = 0.92
+
+
 # Check if data has already been upserted with the same chunk size
 upserted_flag_id = "upserted_flag"
-response = index.fetch(ids=[upserted_flag_id])
-if response and upserted_flag_id in response["vectors"]:
-    stored_chunk_size = response["vectors"][upserted_flag_id]["metadata"].get("chunk_size")
+response = index.fetch(ids=[upserted_flag_id], namespace=namespace)
+if response and upserted_flag_id in response.vectors:
+    stored_chunk_size = response.vectors[upserted_flag_id].metadata.get("chunk_size")
     if stored_chunk_size == chunk_size:
         print("Data already upserted with the same chunk size. Skipping upsert.")
     else:
         print("Chunk size has changed. Deleting existing vectors and upserting new ones.")
-        index.delete(delete_all=True)
+        index.delete(delete_all=True, namespace=namespace)
 else:
     print("No existing data found. Proceeding with upsert.")
 
 
 # Upsert embeddings into the Pinecone index
-if not response or upserted_flag_id not in response["vectors"] or stored_chunk_size != chunk_size:
+if not response or upserted_flag_id not in response.vectors or stored_chunk_size != chunk_size:
     for i, chunk in enumerate(chunks_with_metadata):
         chunk_embedding = embeddings.embed_query(chunk["text"])
-        index.upsert([(str(i), chunk_embedding, {"text": chunk["text"], "page": chunk["page"]})])
+        index.upsert([(str(i), chunk_embedding, {"text": chunk["text"], "page": chunk["page"]})], namespace=namespace)
 
     # Upsert a flag to indicate data has been upserted, including the chunk size
-    index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": chunk_size})])
+    index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": chunk_size})], namespace=namespace)
     print("Finished upserting embeddings.")
 
+    # Cached answers were grounded in the old data, so drop them
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+# Load the semantic cache from disk, or start an empty one (inner product on L2-normalized vectors is cosine similarity)
+cache_index = faiss.IndexFlatIP(1536)
+cached_answers = []
+if os.path.exists(cache_index_path) and os.path.exists(cache_answers_path):
+    stored_index = faiss.read_index(cache_index_path)
+    with open(cache_answers_path, "r") as f:
+        stored_answers = json.load(f)
+    # The two files are replaced one after the other, so only trust them when they agree
+    if stored_index.ntotal == len(stored_answers):
+        cache_index, cached_answers = stored_index, stored_answers
+
 
 # Query the Pinecone index
 llm = ChatOpenAI(
@@ -114,32 +136,80 @@ llm = ChatOpenAI(
     temperature=0
 )
 
-while True:
-    query = input("Ask a question (or type exit to quit): ")
-    if query.lower() == "exit":
-        break
-    
+prompt_template = ChatPromptTemplate.from_messages(
+    [
+        ("system", "You are an AI assistant that strictly follows the provided context to answer questions. "
+        "You **must not** use any external knowledge, even if the user asks you to. "
+        "If the answer is not found in the provided context, respond with:\n"
+        "'I can only answer based on the provided context, and no relevant information is available.'\n\n"
+        "Context: {context}"),
+        ("human", "Question: {question}")
+    ]
+)
+
+chain = prompt_template | llm | StrOutputParser()
+
+
+async def answer_question(query):
+    """Answer a single question, from the semantic cache when possible, otherwise from Pinecone and the LLM."""
     print(f"\nQuery: {query}")
-    query_embedding = embeddings.embed_query(query)
-    response = index.query(vector=query_embedding, top_k=3, include_metadata=True)
+    query_embedding = await embeddings.aembed_query(query)
+
+    # Reuse the stored answer if a close enough question has already been answered
+    normalized_query = np.array([query_embedding], dtype="float32")
+    faiss.normalize_L2(normalized_query)
+    if cache_index.ntotal > 0:
+        scores, ids = cache_index.search(normalized_query, 1)
+        if scores[0][0] >= cache_score_threshold:
+            answer = cached_answers[ids[0][0]]
+            print(f"\nAnswer (cached): {answer}")
+            return answer
+
+    # The gRPC index is synchronous, so run the query in a worker thread to keep the event loop free
+    # The upserted flag shares the namespace and has no page, so keep it out of the results
+    response = await asyncio.to_thread(index.query, vector=query_embedding, top_k=3, include_metadata=True, include_values=False, namespace=namespace, filter={"text": {"$ne": "upserted_flag"}})
     
-    matched_data = [(match.metadata["text"], match.metadata["page"]) for match in response.matches]
+    matched_data = [(match.metadata["text"], match.metadata.get("page", "Unknown")) for match in response.matches]
     augmented_content = "\n\n".join([f"[Page {page}] {text}" for text, page in matched_data])
     sources = ", ".join(set([page for _, page in matched_data]))
     print(f"\nAugmented content:\n{augmented_content}")
     
-    prompt_template = ChatPromptTemplate.from_messages(
-        [
-            ("system", "You are an AI assistant that strictly follows the provided context to answer questions. "
-            "You **must not** use any external knowledge, even if the user asks you to. "
-            "If the answer is not found in the provided context, respond with:\n"
-            "'I can only answer based on the provided context, and no relevant information is available.'\n\n"
-            "Context: {context}"),
-            ("human", "Question: {question}")
-        ]
-    )
-    
-    prepare_prompt_template = RunnableLambda(lambda x: prompt_template.format_prompt(context=augmented_content, question=query))
-    
-    chain = prepare_prompt_template | llm | StrOutputParser()
-    print(f"\nAnswer: {chain.invoke({})}")
\ No newline at end of file
+    answer = await chain.ainvoke({"context": augmented_content, "question": query})
+    print(f"\nAnswer: {answer}")
+
+    # Add the answer to the semantic cache, it is persisted once when the session ends
+    cache_index.add(normalized_query)
+    cached_answers.append(answer)
+    return answer
+
+
+def save_semantic_cache():
+    """Persist the semantic cache for the next session."""
+    # Write to temporary files first so an interrupted write never leaves a half-written cache behind
+    os.makedirs(cache_dir, exist_ok=True)
+    faiss.write_index(cache_index, cache_index_path + ".tmp")
+    with open(cache_answers_path + ".tmp", "w") as f:
+        json.dump(cached_answers, f)
+    os.replace(cache_index_path + ".tmp", cache_index_path)
+    os.replace(cache_answers_path + ".tmp", cache_answers_path)
+
+
+async def main():
+    try:
+        # Answer every question from a file concurrently, one per line
+        if len(sys.argv) > 1:
+            with open(sys.argv[1], "r") as f:
+                queries = [line.strip() for line in f if line.strip()]
+            await asyncio.gather(*[answer_question(query) for query in queries])
+            return
+
+        while True:
+            query = input("Ask a question (or type exit to quit): ")
+            if query.lower() == "exit":
+                break
+            await answer_question(query)
+    finally:
+        save_semantic_cache()
+
+
+asyncio.run(main())
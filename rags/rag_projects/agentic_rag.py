@@ -1,18 +1,17 @@
-import streamlit as st
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.output_parsers import StrOutputParser
-from langchain.chains.conversation.memory import ConversationBufferWindowMemory
-from pinecone import Pinecone, ServerlessSpec
-from pinecone.core.openapi.shared.exceptions import PineconeApiException
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema.runnable import RunnableLambda
-from langchain_groq import ChatGroq
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import create_react_agent, AgentExecutor, tool
 from dotenv import load_dotenv
 from langchain import hub
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import hashlib
 import os
 
 
@@ -20,12 +19,24 @@ load_dotenv()
 
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 20
+EMBEDDING_BATCH_SIZE = 1024
+UPSERT_BATCH_SIZE = 100
+# Below this total PDF size, worker process startup costs more than parsing in place
+PARALLEL_PDF_MIN_BYTES = 20 * 1024 * 1024
+# Bump the namespace version when the chunking or metadata format changes
+NAMESPACE = "pdfs_v1"
 
-# Embedding model
-embeddings = OpenAIEmbeddings(
+# Embedding model, cached on disk so identical chunks and queries are only embedded once
+underlying_embeddings = OpenAIEmbeddings(
     openai_api_key=os.getenv("OPENAI_API_KEY"),
     model="text-embedding-3-small"
 )
+embeddings = CacheBackedEmbeddings.from_bytes_store(
+    underlying_embeddings,
+    LocalFileStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".emb_cache")),
+    namespace=underlying_embeddings.model,
+    query_embedding_cache=True
+)
 
 # Chat model
 llm = ChatOpenAI(
@@ -34,81 +45,110 @@ llm = ChatOpenAI(
 )
 
 
-def load_pdf(folder_path):
+def _load_one(file_path):
     """
-    Loads all PDF files from a given folder.
+    Loads every page of a single PDF file. Runs in a worker process.
     
     Args:
-        folder_path (str): Path to the folder containing PDFs.
+        file_path (str): Path to the PDF file.
 
     Returns:
-        list: A list of documents loaded from all PDFs.
+        list: A list of documents, one per page.
+    """
+    
+    return PyPDFLoader(file_path).load()
+
+
+def iter_pages(folder_path):
+    """
+    Loads all PDF files from a given folder, yielding one page at a time.
+    
+    Small folders are streamed lazily page by page in this process. Large folders are
+    parsed in parallel, one worker process per file, and each file's pages are yielded
+    once its worker has finished.
+    
+    Args:
+        folder_path (str): Path to the folder containing PDFs.
+
+    Yields:
+        Document: One document per PDF page, across all PDFs.
     """
     
-    documents = []
-    full_text = ""
     try:
-        for file_name in os.listdir(folder_path):
-            if file_name.endswith(".pdf"):
-                file_path = os.path.join(folder_path, file_name)
-                loader = PyPDFLoader(file_path)
-                documents.extend(loader.load())
-                for doc in documents:
-                    full_text += doc.page_content
-        return documents, full_text
+        pdf_paths = [
+            os.path.join(folder_path, file_name)
+            for file_name in os.listdir(folder_path)
+            if file_name.endswith(".pdf")
+        ]
+
+        # Each spawned worker re-imports the calling script, so small corpora are parsed in place
+        total_bytes = sum(os.path.getsize(file_path) for file_path in pdf_paths)
+        if len(pdf_paths) <= 1 or total_bytes < PARALLEL_PDF_MIN_BYTES:
+            for file_path in pdf_paths:
+                yield from PyPDFLoader(file_path).lazy_load()
+            return
+
+        # PDF parsing is CPU-bound pure Python, so spread the files across processes.
+        # Spawned workers start clean instead of forking a process that already runs gRPC threads.
+        with ProcessPoolExecutor(
+            max_workers=min(len(pdf_paths), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for pages in executor.map(_load_one, pdf_paths):
+                yield from pages
     except Exception as e:
         raise RuntimeError(f"An error occurred while reading the PDF file: {e}")
 
 
+def hash_pdfs(folder_path):
+    """
+    Fingerprints the PDF files in a folder from their names and raw bytes, without parsing them.
+    
+    Args:
+        folder_path (str): Path to the folder containing PDFs.
+
+    Returns:
+        str: A SHA-256 hex digest that changes whenever a PDF is added, removed or edited.
+    """
+    
+    corpus_hash = hashlib.sha256()
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith(".pdf"):
+            corpus_hash.update(file_name.encode())
+            with open(os.path.join(folder_path, file_name), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    corpus_hash.update(block)
+    return corpus_hash.hexdigest()
+
+
 
-def chunk_text(documents, full_text):
+def chunk_text(documents):
     """
-    Split the text into chunks and assign metadata to each chunk.
+    Split each page into chunks and assign the page metadata to each chunk.
     
     Args:
-        documents (list): A list of documents.
-        full_text (str): The full text to be split into chunks.
+        documents (iterable): Documents, one per PDF page, consumed in a single pass.
     
     Returns:
         list: A list of chunks with metadata.
     """
     
-    # Split the text into chunks and assign metadata to each chunk
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         separators=["\n\n", "\n", " ", ""],
         length_function=len
     )
-    raw_chunks = text_splitter.split_text(full_text)
 
-    # Assign metadata to chunks
+    # Split page by page so every chunk inherits the metadata of the page it came from
     chunks = []
     for doc in documents:
-        current_page_text = doc.page_content
-        current_page_metadata = doc.metadata
-        for chunk in raw_chunks:
-            if chunk in current_page_text or chunk[:50] in current_page_text:
-                if not chunk in current_page_text:
-                    chunks.append(
-                        {
-                            "text": chunk.strip(),
-                            "metadata": {
-                                "source":current_page_metadata["source"],
-                                "page":current_page_metadata["page_label"] + "," + str(int(current_page_metadata["page_label"]) + 1)
-                            }
-                        }
-                    )
-                    break
-                chunks.append(
-                        {
-                            "text": chunk.strip(),
-                            "metadata": {
-                                "source":current_page_metadata["source"],
-                                "page":current_page_metadata["page_label"]
-                            }
-                        }
-                    )
+        source = doc.metadata["source"]
+        page = doc.metadata["page_label"]
+        chunks.extend(
+            {"text": chunk.strip(), "metadata": {"source": source, "page": page}}
+            for chunk in text_splitter.split_text(doc.page_content)
+        )
     return chunks
 
 
@@ -122,20 +162,14 @@ def create_pinecone_index():
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
     index_name = "agentic-rag-pinecone"
 
-    if index_name not in pc.list_indexes():
-        try:
-            pc.create_index(
-                name=index_name,
-                dimension=1536,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-            print(f"Index '{index_name}' created.")
-        except PineconeApiException as e:
-            if e.status == 409:  # Conflict error, index already exists
-                print(f"Index '{index_name}' already exists.")
-            else: 
-                raise e  
+    if not pc.has_index(index_name):
+        pc.create_index(
+            name=index_name,
+            dimension=1536,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+        print(f"Index '{index_name}' created.")
     else:
         print(f"Index '{index_name}' already exists.")
 
@@ -143,43 +177,56 @@ def create_pinecone_index():
     return index
 
 
-def upsert_data_to_pinecone(documents, full_text, index):
+def upsert_data_to_pinecone(documents, index, corpus_hash):
     """
     Upsert the text chunks and their embeddings into the Pinecone index.
     
     Args:
-        documents (list): A list of documents.
-        full_text (str): The full text to be split into chunks.
+        documents (iterable): Documents, one per PDF page. Only consumed when the corpus has changed.
         index (Index): A Pinecone index object.
+        corpus_hash (str): Fingerprint of the PDFs, from hash_pdfs.
     """
 
-    try:
-        chunks = chunk_text(documents, full_text)
-    except Exception as e:
-        raise RuntimeError(f"An error occurred while splitting the text: {e}")
-    
-    # Check if data has already been upserted with the same chunk size
+    # Check if the same documents have already been upserted with the same chunk size
     upserted_flag_id = "upserted_flag"
-    response = index.fetch(ids=[upserted_flag_id])
-    if response and upserted_flag_id in response["vectors"]:
-        stored_chunk_size = response["vectors"][upserted_flag_id]["metadata"].get("chunk_size")
-        if stored_chunk_size == CHUNK_SIZE:
-            print("Data already upserted with the same chunk size. Skipping upsert.")
-        else:
-            print("Chunk size has changed. Deleting existing vectors and upserting new ones.")
-            index.delete(delete_all=True)
+    response = index.fetch(ids=[upserted_flag_id], namespace=NAMESPACE)
+    if response and upserted_flag_id in response.vectors:
+        flag_metadata = response.vectors[upserted_flag_id].metadata
+        if flag_metadata.get("chunk_size") == CHUNK_SIZE and flag_metadata.get("corpus_hash") == corpus_hash:
+            print("Data already upserted with the same documents and chunk size. Skipping upsert.")
+            return
+        print("Documents or chunk size have changed. Deleting existing vectors and upserting new ones.")
+        index.delete(delete_all=True, namespace=NAMESPACE)
     else:
         print("No existing data found. Proceeding with upsert.")
 
-    # Upsert embeddings into the Pinecone index
-    if not response or upserted_flag_id not in response["vectors"] or stored_chunk_size != CHUNK_SIZE:
-        for i, chunk in enumerate(chunks):
-            chunk_embedding = embeddings.embed_query(chunk["text"])
-            index.upsert([(str(i), chunk_embedding, {"text": chunk["text"], "metadata": str(chunk["metadata"])})])
+    try:
+        chunks = chunk_text(documents)
+    except Exception as e:
+        raise RuntimeError(f"An error occurred while splitting the text: {e}")
+
+    # Embed the chunks in batches, one request per batch instead of one per chunk
+    texts = [chunk["text"] for chunk in chunks]
+    chunk_embeddings = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        chunk_embeddings.extend(embeddings.embed_documents(texts[start:start + EMBEDDING_BATCH_SIZE]))
+
+    vectors = [
+        (str(i), chunk_embedding, {"text": chunk["text"], "source": chunk["metadata"]["source"], "page": chunk["metadata"]["page"]})
+        for i, (chunk, chunk_embedding) in enumerate(zip(chunks, chunk_embeddings))
+    ]
+
+    # Send the upsert batches concurrently as gRPC futures and wait for all of them
+    async_results = [
+        index.upsert(vectors=vectors[start:start + UPSERT_BATCH_SIZE], namespace=NAMESPACE, async_req=True)
+        for start in range(0, len(vectors), UPSERT_BATCH_SIZE)
+    ]
+    for async_result in async_results:
+        async_result.result()
 
-        # Upsert a flag to indicate data has been upserted, including the chunk size
-        index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": CHUNK_SIZE})])
-        print("Finished upserting embeddings.")
+    # Upsert a flag to indicate data has been upserted, including the chunk size and corpus hash
+    index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": CHUNK_SIZE, "corpus_hash": corpus_hash})], namespace=NAMESPACE)
+    print("Finished upserting embeddings.")
 
 
 @tool
@@ -194,16 +241,19 @@ def document_retrieval_tool(query):
     
     current_dir = os.path.dirname(os.path.abspath(__file__))
     documents_dir = os.path.join(current_dir, "documents")
-    documents, full_text = load_pdf(documents_dir)
+    # Hashing the raw files is cheap, so the PDFs are only parsed when they have changed
+    corpus_hash = hash_pdfs(documents_dir)
+    documents = iter_pages(documents_dir)
     try:
         index = create_pinecone_index()
     except Exception as e:
         raise RuntimeError(f"An error occurred while creating the Pinecone index: {e}")
     
-    upsert_data_to_pinecone(documents, full_text, index)
+    upsert_data_to_pinecone(documents, index, corpus_hash)
     query_embedding = embeddings.embed_query(query)
-    response = index.query(vector=query_embedding, top_k=3, include_metadata=True)
-    matched_data = [(match.metadata["text"], match.metadata) for match in response.matches]
+    # The upserted flag shares the namespace and has no page, so keep it out of the results
+    response = index.query(vector=query_embedding, top_k=3, include_metadata=True, include_values=False, namespace=NAMESPACE, filter={"text": {"$ne": "upserted_flag"}})
+    matched_data = [(match.metadata["text"], match.metadata.get("page", "Unknown")) for match in response.matches]
     if matched_data:
         return "\n\n".join([f"[Page {page}] {text}" for text, page in matched_data])
     else:
@@ -1,5 +1,4 @@
 import streamlit as st
-from models.embeddings import get_embedding_model
 from models.openai_llm import get_llm
 from tools import document_retrieval_tool, web_search_tool
 from langchain.chains.conversation.memory import ConversationBufferMemory
@@ -10,7 +9,6 @@ from langchain import hub
 load_dotenv()
 
 
-embeddings = get_embedding_model()
 llm = get_llm()
 
 
@@ -10,4 +10,10 @@ class Config:
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 20
+    EMBEDDING_BATCH_SIZE = 1024
+    UPSERT_BATCH_SIZE = 100
+    # Below this total PDF size, worker process startup costs more than parsing in place
+    PARALLEL_PDF_MIN_BYTES = 20 * 1024 * 1024
     INDEX_NAME = "agentic-rag-pinecone"
+    # Bump the namespace version when the chunking or metadata format changes
+    NAMESPACE = "pdfs_v1"
@@ -1,11 +1,22 @@
 import os
 from langchain_openai import OpenAIEmbeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Embeddings are cached on disk, keyed by text, so identical chunks and queries are only embedded once
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".emb_cache")
+
 def get_embedding_model():
-    return OpenAIEmbeddings(
+    underlying_embeddings = OpenAIEmbeddings(
         openai_api_key=os.getenv("OPENAI_API_KEY"),
         model="text-embedding-3-small"
     )
+    return CacheBackedEmbeddings.from_bytes_store(
+        underlying_embeddings,
+        LocalFileStore(EMBEDDING_CACHE_DIR),
+        namespace=underlying_embeddings.model,
+        query_embedding_cache=True
+    )
@@ -1,7 +1,8 @@
 # tools.py
 import os
 from langchain.agents import tool
-from utils.pdf_utils import load_pdf
+from config import Config
+from utils.pdf_utils import iter_pages, hash_pdfs
 from utils.pinecone_utils import create_pinecone_index, upsert_data_to_pinecone
 from langchain_community.tools import DuckDuckGoSearchRun
 from models.embeddings import get_embedding_model
@@ -19,18 +20,21 @@ def document_retrieval_tool(query):
     
     current_dir = os.path.dirname(os.path.abspath(__file__))
     documents_dir = os.path.join(current_dir, "documents")
-    documents, full_text = load_pdf(documents_dir)
+    # Hashing the raw files is cheap, so the PDFs are only parsed when they have changed
+    corpus_hash = hash_pdfs(documents_dir)
+    documents = iter_pages(documents_dir)
     try:
         index = create_pinecone_index()
     except Exception as e:
         raise RuntimeError(f"An error occurred while creating the Pinecone index: {e}")
     
-    upsert_data_to_pinecone(documents, full_text, index)
+    upsert_data_to_pinecone(documents, index, corpus_hash)
     
     embeddings = get_embedding_model()
     query_embedding = embeddings.embed_query(query)
-    response = index.query(vector=query_embedding, top_k=3, include_metadata=True)
-    matched_data = [(match.metadata["text"], match.metadata) for match in response.matches]
+    # The upserted flag shares the namespace and has no page, so keep it out of the results
+    response = index.query(vector=query_embedding, top_k=3, include_metadata=True, include_values=False, namespace=Config.NAMESPACE, filter={"text": {"$ne": "upserted_flag"}})
+    matched_data = [(match.metadata["text"], match.metadata.get("page", "Unknown")) for match in response.matches]
     if matched_data:
         return "\n\n".join([f"[Page {page}] {text}" for text, page in matched_data])
     else:
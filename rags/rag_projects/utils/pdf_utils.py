@@ -1,85 +1,116 @@
 # utils/pdf_utils.py
 import os
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import Config
 
 
-def load_pdf(folder_path):
+def _load_one(file_path):
     """
-    Loads all PDF files from a given folder.
+    Loads every page of a single PDF file. Runs in a worker process.
     
     Args:
-        folder_path (str): Path to the folder containing PDFs.
+        file_path (str): Path to the PDF file.
 
     Returns:
-        list: A list of documents loaded from all PDFs.
+        list: A list of documents, one per page.
+    """
+    
+    return PyPDFLoader(file_path).load()
+
+
+def iter_pages(folder_path):
+    """
+    Loads all PDF files from a given folder, yielding one page at a time.
+    
+    Small folders are streamed lazily page by page in this process. Large folders are
+    parsed in parallel, one worker process per file, and each file's pages are yielded
+    once its worker has finished.
+    
+    Args:
+        folder_path (str): Path to the folder containing PDFs.
+
+    Yields:
+        Document: One document per PDF page, across all PDFs.
     """
     
-    documents = []
-    full_text = ""
     try:
+        pdf_paths = []
         for file_name in os.listdir(folder_path):
             if file_name.endswith(".pdf"):
-                file_path = os.path.join(folder_path, file_name)
-                loader = PyPDFLoader(file_path)
-                documents.extend(loader.load())
-                for doc in documents:
-                    full_text += doc.page_content
+                pdf_paths.append(os.path.join(folder_path, file_name))
             else:
                 raise RuntimeError(f"Invalid file format. Only PDF files are supported.")
-        return documents, full_text
+
+        # Each spawned worker re-imports the calling script, so small corpora are parsed in place
+        total_bytes = sum(os.path.getsize(file_path) for file_path in pdf_paths)
+        if len(pdf_paths) <= 1 or total_bytes < Config.PARALLEL_PDF_MIN_BYTES:
+            for file_path in pdf_paths:
+                yield from PyPDFLoader(file_path).lazy_load()
+            return
+
+        # PDF parsing is CPU-bound pure Python, so spread the files across processes.
+        # Spawned workers start clean instead of forking a process that already runs gRPC threads.
+        with ProcessPoolExecutor(
+            max_workers=min(len(pdf_paths), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for pages in executor.map(_load_one, pdf_paths):
+                yield from pages
     except Exception as e:
         raise RuntimeError(f"An error occurred while reading the PDF file: {e}")
 
 
+def hash_pdfs(folder_path):
+    """
+    Fingerprints the PDF files in a folder from their names and raw bytes, without parsing them.
+    
+    Args:
+        folder_path (str): Path to the folder containing PDFs.
+
+    Returns:
+        str: A SHA-256 hex digest that changes whenever a PDF is added, removed or edited.
+    """
+    
+    corpus_hash = hashlib.sha256()
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith(".pdf"):
+            corpus_hash.update(file_name.encode())
+            with open(os.path.join(folder_path, file_name), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    corpus_hash.update(block)
+    return corpus_hash.hexdigest()
+
+
 
-def chunk_text(documents, full_text):
+def chunk_text(documents):
     """
-    Split the text into chunks and assign metadata to each chunk.
+    Split each page into chunks and assign the page metadata to each chunk.
     
     Args:
-        documents (list): A list of documents.
-        full_text (str): The full text to be split into chunks.
+        documents (iterable): Documents, one per PDF page, consumed in a single pass.
     
     Returns:
         list: A list of chunks with metadata.
     """
     
-    # Split the text into chunks and assign metadata to each chunk
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=Config.CHUNK_SIZE,
         chunk_overlap=Config.CHUNK_OVERLAP,
         separators=["\n\n", "\n", " ", ""],
         length_function=len
     )
-    raw_chunks = text_splitter.split_text(full_text)
 
-    # Assign metadata to chunks
+    # Split page by page so every chunk inherits the metadata of the page it came from
     chunks = []
     for doc in documents:
-        current_page_text = doc.page_content
-        current_page_metadata = doc.metadata
-        for chunk in raw_chunks:
-            if chunk in current_page_text or chunk[:50] in current_page_text:
-                if not chunk in current_page_text:
-                    chunks.append(
-                        {
-                            "text": chunk.strip(),
-                            "metadata": {
-                                "source":current_page_metadata["source"],
-                                "page":current_page_metadata["page_label"] + "," + str(int(current_page_metadata["page_label"]) + 1)
-                            }
-                        }
-                    )
-                    break
-                chunks.append(
-                        {
-                            "text": chunk.strip(),
-                            "metadata": {
-                                "source":current_page_metadata["source"],
-                                "page":current_page_metadata["page_label"]
-                            }
-                        }
-                    )
+        source = doc.metadata["source"]
+        page = doc.metadata["page_label"]
+        chunks.extend(
+            {"text": chunk.strip(), "metadata": {"source": source, "page": page}}
+            for chunk in text_splitter.split_text(doc.page_content)
+        )
     return chunks
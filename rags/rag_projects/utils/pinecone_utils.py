@@ -1,14 +1,17 @@
 # utils/pinecone_utils.py
 import os
-from pinecone import Pinecone, ServerlessSpec
-from pinecone.core.openapi.shared.exceptions import PineconeApiException
-from langchain_openai import OpenAIEmbeddings
+from pinecone import ServerlessSpec
+from pinecone.grpc import PineconeGRPC as Pinecone
 from config import Config
+from models.embeddings import get_embedding_model
 from utils.pdf_utils import chunk_text
 
 INDEX_NAME = Config.INDEX_NAME
+NAMESPACE = Config.NAMESPACE
 CHUNK_SIZE = Config.CHUNK_SIZE
-embeddings = OpenAIEmbeddings()
+EMBEDDING_BATCH_SIZE = Config.EMBEDDING_BATCH_SIZE
+UPSERT_BATCH_SIZE = Config.UPSERT_BATCH_SIZE
+embeddings = get_embedding_model()
 
 def create_pinecone_index():
     """
@@ -19,20 +22,14 @@ def create_pinecone_index():
     """
     pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 
-    if INDEX_NAME not in pc.list_indexes():
-        try:
-            pc.create_index(
-                name=INDEX_NAME,
-                dimension=1536,
-                metric="cosine",
-                spec=ServerlessSpec(cloud="aws", region="us-east-1")
-            )
-            print(f"Index '{INDEX_NAME}' created.")
-        except PineconeApiException as e:
-            if e.status == 409:  # Conflict error, index already exists
-                print(f"Index '{INDEX_NAME}' already exists.")
-            else: 
-                raise e  
+    if not pc.has_index(INDEX_NAME):
+        pc.create_index(
+            name=INDEX_NAME,
+            dimension=1536,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1")
+        )
+        print(f"Index '{INDEX_NAME}' created.")
     else:
         print(f"Index '{INDEX_NAME}' already exists.")
 
@@ -40,40 +37,53 @@ def create_pinecone_index():
     return index
 
 
-def upsert_data_to_pinecone(documents, full_text, index):
+def upsert_data_to_pinecone(documents, index, corpus_hash):
     """
     Upsert the text chunks and their embeddings into the Pinecone index.
     
     Args:
-        documents (list): A list of documents.
-        full_text (str): The full text to be split into chunks.
+        documents (iterable): Documents, one per PDF page. Only consumed when the corpus has changed.
         index (Index): A Pinecone index object.
+        corpus_hash (str): Fingerprint of the PDFs, from hash_pdfs.
     """
 
-    try:
-        chunks = chunk_text(documents, full_text)
-    except Exception as e:
-        raise RuntimeError(f"An error occurred while splitting the text: {e}")
-    
-    # Check if data has already been upserted with the same chunk size
+    # Check if the same documents have already been upserted with the same chunk size
     upserted_flag_id = "upserted_flag"
-    response = index.fetch(ids=[upserted_flag_id])
-    if response and upserted_flag_id in response["vectors"]:
-        stored_chunk_size = response["vectors"][upserted_flag_id]["metadata"].get("chunk_size")
-        if stored_chunk_size == CHUNK_SIZE:
-            print("Data already upserted with the same chunk size. Skipping upsert.")
-        else:
-            print("Chunk size has changed. Deleting existing vectors and upserting new ones.")
-            index.delete(delete_all=True)
+    response = index.fetch(ids=[upserted_flag_id], namespace=NAMESPACE)
+    if response and upserted_flag_id in response.vectors:
+        flag_metadata = response.vectors[upserted_flag_id].metadata
+        if flag_metadata.get("chunk_size") == CHUNK_SIZE and flag_metadata.get("corpus_hash") == corpus_hash:
+            print("Data already upserted with the same documents and chunk size. Skipping upsert.")
+            return
+        print("Documents or chunk size have changed. Deleting existing vectors and upserting new ones.")
+        index.delete(delete_all=True, namespace=NAMESPACE)
     else:
         print("No existing data found. Proceeding with upsert.")
 
-    # Upsert embeddings into the Pinecone index
-    if not response or upserted_flag_id not in response["vectors"] or stored_chunk_size != CHUNK_SIZE:
-        for i, chunk in enumerate(chunks):
-            chunk_embedding = embeddings.embed_query(chunk["text"])
-            index.upsert([(str(i), chunk_embedding, {"text": chunk["text"], "metadata": str(chunk["metadata"])})])
+    try:
+        chunks = chunk_text(documents)
+    except Exception as e:
+        raise RuntimeError(f"An error occurred while splitting the text: {e}")
+
+    # Embed the chunks in batches, one request per batch instead of one per chunk
+    texts = [chunk["text"] for chunk in chunks]
+    chunk_embeddings = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        chunk_embeddings.extend(embeddings.embed_documents(texts[start:start + EMBEDDING_BATCH_SIZE]))
+
+    vectors = [
+        (str(i), chunk_embedding, {"text": chunk["text"], "source": chunk["metadata"]["source"], "page": chunk["metadata"]["page"]})
+        for i, (chunk, chunk_embedding) in enumerate(zip(chunks, chunk_embeddings))
+    ]
+
+    # Send the upsert batches concurrently as gRPC futures and wait for all of them
+    async_results = [
+        index.upsert(vectors=vectors[start:start + UPSERT_BATCH_SIZE], namespace=NAMESPACE, async_req=True)
+        for start in range(0, len(vectors), UPSERT_BATCH_SIZE)
+    ]
+    for async_result in async_results:
+        async_result.result()
 
-        # Upsert a flag to indicate data has been upserted, including the chunk size
-        index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": CHUNK_SIZE})])
-        print("Finished upserting embeddings.")
+    # Upsert a flag to indicate data has been upserted, including the chunk size and corpus hash
+    index.upsert([(upserted_flag_id, [0.1] * 1536, {"text": "upserted_flag", "chunk_size": CHUNK_SIZE, "corpus_hash": corpus_hash})], namespace=NAMESPACE)
+    print("Finished upserting embeddings.")